@@ -10,11 +10,12 @@ Churn Logic:
 """
 
 import os
-import random
 import uuid
+import asyncio
 from datetime import datetime, timedelta
+import numpy as np
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase._async.client import create_client as create_async_client
 
 # Load environment variables
 load_dotenv()
@@ -22,80 +23,145 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
+# Optional direct Postgres connection, enables COPY-based loading
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+if not DATABASE_URL and (not SUPABASE_URL or not SUPABASE_KEY):
     raise ValueError("Missing SUPABASE_URL or SUPABASE_KEY in .env file")
 
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Insert tuning (rows per request, requests in flight)
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "500"))
+INSERT_CONCURRENCY = int(os.getenv("INSERT_CONCURRENCY", "4"))
+
+# Seeded PCG64 generator so feature draws are reproducible
+RNG = np.random.default_rng(int(os.getenv("SEED", "42")))
+
+# Column order and Postgres types for binary COPY
+COPY_COLUMNS = (
+    "user_id",
+    "total_clicks",
+    "avg_session_time",
+    "support_tickets",
+    "days_since_signup",
+    "feature_usage_score",
+    "is_churned",
+)
+COPY_TYPES = ("text", "int4", "float8", "int4", "int4", "float8", "bool")
 
 def generate_user_id() -> str:
     """Generate a unique user ID."""
     return f"user_{uuid.uuid4().hex[:12]}"
 
-def determine_churn(total_clicks: int, support_tickets: int) -> bool:
+def generate_users_vectorized(n: int) -> list:
     """
-    Determine if a user should be marked as churned.
+    Generate n synthetic users with realistic feature values.
     
-    Rules:
+    Every column is drawn for all users at once with NumPy, then zipped
+    into dicts ready for Supabase.
+    
+    Churn rules:
     - >5 support tickets OR <10 clicks: 85% chance of churn
     - Otherwise: 15% chance of churn
     """
-    if support_tickets > 5 or total_clicks < 10:
-        return random.random() < 0.85  # 85% churn rate
-    else:
-        return random.random() < 0.15  # 15% churn rate
-
-def generate_synthetic_user() -> dict:
-    """Generate a single synthetic user with realistic feature values."""
-    
     # Generate base features
-    total_clicks = random.randint(0, 500)
-    support_tickets = random.randint(0, 15)
+    total_clicks = RNG.integers(0, 501, n)
+    support_tickets = RNG.integers(0, 16, n)
     
     # Correlated features (more clicks = usually longer sessions, higher feature usage)
-    base_session_time = random.uniform(0.5, 30.0)
-    if total_clicks > 100:
-        avg_session_time = base_session_time * random.uniform(1.2, 2.0)
-    else:
-        avg_session_time = base_session_time * random.uniform(0.5, 1.0)
+    base_session_time = RNG.uniform(0.5, 30.0, n)
+    session_multiplier = np.where(
+        total_clicks > 100,
+        RNG.uniform(1.2, 2.0, n),
+        RNG.uniform(0.5, 1.0, n)
+    )
+    avg_session_time = base_session_time * session_multiplier
     
-    days_since_signup = random.randint(1, 365)
+    days_since_signup = RNG.integers(1, 366, n)
     
     # Feature usage score (0-100)
-    feature_usage_score = min(100, max(0, 
-        (total_clicks / 5) + 
-        (avg_session_time * 2) - 
-        (support_tickets * 5) + 
-        random.uniform(-10, 10)
-    ))
+    feature_usage_score = np.clip(
+        (total_clicks / 5) +
+        (avg_session_time * 2) -
+        (support_tickets * 5) +
+        RNG.uniform(-10, 10, n),
+        0, 100
+    )
     
     # Determine churn based on business rules
-    is_churned = determine_churn(total_clicks, support_tickets)
-    
-    return {
-        "user_id": generate_user_id(),
-        "total_clicks": total_clicks,
-        "avg_session_time": round(avg_session_time, 2),
-        "support_tickets": support_tickets,
-        "days_since_signup": days_since_signup,
-        "feature_usage_score": round(feature_usage_score, 2),
-        "is_churned": is_churned,
-    }
+    high_risk = (support_tickets > 5) | (total_clicks < 10)
+    churn_probability = np.where(high_risk, 0.85, 0.15)
+    is_churned = RNG.random(n) < churn_probability
+    
+    user_ids = [generate_user_id() for _ in range(n)]
+    
+    return [
+        {
+            "user_id": user_id,
+            "total_clicks": clicks,
+            "avg_session_time": session_time,
+            "support_tickets": tickets,
+            "days_since_signup": days,
+            "feature_usage_score": score,
+            "is_churned": churned,
+        }
+        for user_id, clicks, session_time, tickets, days, score, churned in zip(
+            user_ids,
+            total_clicks.tolist(),
+            np.round(avg_session_time, 2).tolist(),
+            support_tickets.tolist(),
+            days_since_signup.tolist(),
+            np.round(feature_usage_score, 2).tolist(),
+            is_churned.tolist(),
+        )
+    ]
+
+async def insert_users_batch(
+    users: list,
+    batch_size: int = BATCH_SIZE,
+    concurrency: int = INSERT_CONCURRENCY
+) -> int:
+    """
+    Insert users in batches, keeping up to `concurrency` requests in flight.
+    """
+    supabase = await create_async_client(SUPABASE_URL, SUPABASE_KEY)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def push(batch_num: int, batch: list) -> int:
+        async with semaphore:
+            try:
+                result = await supabase.table("user_segments").insert(batch).execute()
+                print(f"  ✓ Inserted batch {batch_num}: {len(result.data)} users")
+                return len(result.data)
+            except Exception as e:
+                print(f"  ✗ Error in batch {batch_num}: {e}")
+                return 0
+    
+    inserted = await asyncio.gather(*(
+        push(i // batch_size + 1, users[i:i + batch_size])
+        for i in range(0, len(users), batch_size)
+    ))
+    
+    return sum(inserted)
 
-def insert_users_batch(users: list, batch_size: int = 100) -> int:
-    """Insert users in batches to avoid timeout issues."""
-    total_inserted = 0
-    
-    for i in range(0, len(users), batch_size):
-        batch = users[i:i + batch_size]
-        try:
-            result = supabase.table("user_segments").insert(batch).execute()
-            total_inserted += len(result.data)
-            print(f"  ✓ Inserted batch {i // batch_size + 1}: {len(result.data)} users")
-        except Exception as e:
-            print(f"  ✗ Error in batch {i // batch_size + 1}: {e}")
-    
-    return total_inserted
+def copy_users(users: list) -> int:
+    """
+    Load users with a single binary COPY over a direct Postgres connection.
+    Bypasses PostgREST and commits once for the whole set.
+    """
+    import psycopg
+    
+    copy_sql = (
+        f"COPY user_segments ({', '.join(COPY_COLUMNS)}) "
+        "FROM STDIN WITH (FORMAT BINARY)"
+    )
+    
+    with psycopg.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        with cur.copy(copy_sql) as copy:
+            copy.set_types(COPY_TYPES)
+            for user in users:
+                copy.write_row(tuple(user[col] for col in COPY_COLUMNS))
+    
+    return len(users)
 
 def main():
     print("=" * 50)
@@ -107,7 +173,7 @@ def main():
     num_users = 1000
     print(f"📊 Generating {num_users} synthetic users...")
     
-    users = [generate_synthetic_user() for _ in range(num_users)]
+    users = generate_users_vectorized(num_users)
     
     # Calculate statistics
     churned_count = sum(1 for u in users if u["is_churned"])
@@ -118,9 +184,14 @@ def main():
     print(f"   Churned users: {churned_count} ({churned_count/len(users)*100:.1f}%)")
     print()
     
-    # Insert into Supabase
-    print(f"📤 Inserting users into Supabase...")
-    total_inserted = insert_users_batch(users)
+    # Insert into Supabase (COPY straight into Postgres when DATABASE_URL is set)
+    if DATABASE_URL:
+        print(f"📤 Copying users into Postgres...")
+        total_inserted = copy_users(users)
+    else:
+        print(f"📤 Inserting users into Supabase "
+              f"(batch size {BATCH_SIZE}, {INSERT_CONCURRENCY} concurrent requests)...")
+        total_inserted = asyncio.run(insert_users_batch(users))
     
     print()
     print("=" * 50)
@@ -7,17 +7,41 @@ Endpoints:
 - GET  /health          - Health check
 - POST /predict         - Single user prediction
 - POST /predict/batch   - Batch predictions
+- POST /predict/batch/raw - Batch predictions from raw feature rows
 - GET  /model/info      - Model metadata
 """
 
 import os
+import re
+import sys
+import time
+import mmap
+import uuid
 import pickle
-from typing import List, Optional
+import asyncio
+import operator
+import itertools
+import threading
+import numpy as np
+import orjson
+import xgboost as xgb
+from typing import List, Optional, Tuple
 from datetime import datetime
+from cachetools import TTLCache
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, conlist
+from supabase._async.client import AsyncClient, create_client as create_async_client
+
+try:
+    from numba import njit
+except ImportError:
+    # Optional: without numba the reason rules run as plain Python
+    def njit(*args, **kwargs):
+        return lambda func: func
 
 # Load environment variables
 load_dotenv()
@@ -26,7 +50,8 @@ load_dotenv()
 app = FastAPI(
     title="ChurnGuard ML API",
     description="Real-time churn prediction powered by XGBoost",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Enable CORS for frontend integration
@@ -43,12 +68,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Model path
+# Model paths
 MODEL_PATH = "models/churn_model.pkl"
+BOOSTER_PATH = "models/churn_model.ubj"
+MODEL_META_PATH = "models/churn_model.json"
+ONNX_MODEL_PATH = "models/churn_model.onnx"
 
 # Global model variable
 model_data = None
 
+# Bumped on every model swap. Part of every model-derived cache key, so a
+# request that started on the old model can't repopulate a cache after the
+# swap has cleared it.
+_model_generation = 0
+
+# Model input columns, in training order
+FEATURE_COLUMNS = (
+    "total_clicks",
+    "avg_session_time",
+    "support_tickets",
+    "days_since_signup",
+    "feature_usage_score"
+)
+
+# Training baseline for drift detection (hardcoded from training data)
+DRIFT_BASELINE = {
+    "total_clicks": {"mean": 300, "std": 200},
+    "avg_session_time": {"mean": 20, "std": 15},
+    "support_tickets": {"mean": 2, "std": 2},
+    "days_since_signup": {"mean": 180, "std": 100},
+    "feature_usage_score": {"mean": 50, "std": 25}
+}
+
+# Shared Supabase client (created once on startup)
+SUPABASE: Optional[AsyncClient] = None
+
+# Recent Supabase reads, plus the last good read per column set as an outage fallback
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", "10"))
+_query_cache = TTLCache(maxsize=64, ttl=QUERY_CACHE_TTL)
+_last_known_rows = {}
+
+# Short-lived cache for dashboard endpoints backed by Supabase
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "30"))
+_response_cache = TTLCache(maxsize=64, ttl=RESPONSE_CACHE_TTL)
+_response_cache_lock = asyncio.Lock()
+
+# Recent /predict responses keyed on model generation and exact feature tuple
+PREDICTION_CACHE_TTL = int(os.getenv("PREDICTION_CACHE_TTL", "300"))
+_prediction_cache = TTLCache(maxsize=10_000, ttl=PREDICTION_CACHE_TTL)
+_prediction_cache_lock = threading.Lock()
+
+# Per-thread (1, 5) input buffer for single predictions
+_row_buffers = threading.local()
+
+# Retraining jobs by id (in-process; lost on restart)
+RETRAIN_JOBS = {}
+
+# User rows per chunk when streaming /users/risk
+STREAM_CHUNK_ROWS = 100
+
+# Most recent (epoch second, ISO timestamp) pair, see now_iso()
+_timestamp_cache = (0, "")
+
+# Serialized bodies for endpoints that only change when the model does
+_static_payloads = {}
+
 
 # Request/Response Models
 class UserFeatures(BaseModel):
@@ -85,6 +169,18 @@ class BatchPredictionRequest(BaseModel):
     users: List[UserFeatures]
 
 
+class BatchPredictionRawRequest(BaseModel):
+    """Batch prediction request with positional feature rows (machine clients)."""
+    rows: List[conlist(float, min_length=5, max_length=5)]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "rows": [[50, 12.5, 2, 30, 65.0]]
+            }
+        }
+
+
 class BatchPredictionResponse(BaseModel):
     """Batch prediction response."""
     predictions: List[PredictionResponse]
@@ -108,123 +204,543 @@ class HealthResponse(BaseModel):
     timestamp: str
 
 
+def read_model() -> dict:
+    """
+    Read the trained model from disk without installing it.
+    Prefers the native booster (.ubj + .json metadata) written by
+    train_model.py, falling back to the pickled sklearn model.
+    """
+    if os.path.exists(BOOSTER_PATH) and os.path.exists(MODEL_META_PATH):
+        with open(MODEL_META_PATH, 'rb') as f:
+            loaded = orjson.loads(f.read())
+        loaded['booster'] = xgb.Booster(model_file=BOOSTER_PATH)
+        source = BOOSTER_PATH
+    elif os.path.exists(MODEL_PATH):
+        with open(MODEL_PATH, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            loaded = pickle.loads(buffer)
+        # Native booster for inference, skipping the sklearn wrapper
+        loaded['booster'] = loaded.pop('model').get_booster()
+        source = MODEL_PATH
+    else:
+        raise FileNotFoundError(f"Model not found at {MODEL_PATH}. Run train_model.py first.")
+    
+    # Pinned to one thread: concurrency comes from uvicorn workers and the
+    # request threadpool, not from XGBoost fanning out on every call.
+    loaded['booster'].set_param({'nthread': 1})
+    loaded['onnx'] = load_onnx_session(loaded.get('trained_at', ''))
+    loaded['treelite'] = load_treelite_predictor(loaded.get('trained_at', ''))
+    
+    print(f"✅ Model loaded from {source}")
+    return loaded
+
+
+def activate_model(loaded: dict):
+    """Swap in a model returned by read_model and drop results of the old one."""
+    global model_data, _model_generation
+    
+    # Bump only after the swap: a reader that sees the new generation is
+    # then guaranteed to also see the new model
+    model_data = loaded
+    _model_generation += 1
+    
+    # Cached predictions belong to the previous model
+    with _prediction_cache_lock:
+        _prediction_cache.clear()
+    _response_cache.clear()
+    _static_payloads.clear()
+
+
 def load_model():
     """Load the trained model."""
-    global model_data
+    activate_model(read_model())
+    return model_data
+
+
+# Recommended action for each risk level
+RECOMMENDATIONS = {
+    "HIGH": "Immediate intervention required. Consider offering retention incentives.",
+    "MEDIUM": "Proactive outreach recommended. Schedule a check-in call.",
+    "LOW": "User appears engaged. Continue current engagement strategy."
+}
+
+# Risk bucket lookups: index 0/1/2 = LOW/MEDIUM/HIGH
+MEDIUM_RISK_THRESHOLD = 0.4
+HIGH_RISK_THRESHOLD = 0.7
+RISK_LEVELS = ("LOW", "MEDIUM", "HIGH")
+RISK_RECOMMENDATIONS = tuple(RECOMMENDATIONS[level] for level in RISK_LEVELS)
+
+
+def load_onnx_session(trained_at: str):
+    """
+    Load the ONNX export of the model into onnxruntime, if available.
+    Returns None when the file or onnxruntime is missing, or when the export
+    was made from a different model than the one trained at `trained_at`.
+    """
+    if not os.path.exists(ONNX_MODEL_PATH):
+        return None
     
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"Model not found at {MODEL_PATH}. Run train_model.py first.")
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        print(f"⚠️ Warning: onnxruntime not installed, ignoring {ONNX_MODEL_PATH}")
+        return None
+    
+    session_options = ort.SessionOptions()
+    session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session_options.intra_op_num_threads = 1
+    session = ort.InferenceSession(
+        ONNX_MODEL_PATH,
+        session_options,
+        providers=["CPUExecutionProvider"]
+    )
     
-    with open(MODEL_PATH, 'rb') as f:
-        model_data = pickle.load(f)
+    exported_from = session.get_modelmeta().custom_metadata_map.get("trained_at")
+    if exported_from != trained_at:
+        print(f"⚠️ Warning: {ONNX_MODEL_PATH} is from another model ({exported_from}), ignoring it")
+        return None
     
-    print(f"✅ Model loaded from {MODEL_PATH}")
-    return model_data
+    print(f"✅ ONNX model loaded from {ONNX_MODEL_PATH}")
+    return session
+
+
+def treelite_lib_path(trained_at: str) -> str:
+    """Compiled library for the model trained at `trained_at` (see train_model.py)."""
+    tag = re.sub(r"\W", "", trained_at)
+    return f"models/churn_model.{tag}.so"
+
+
+def load_treelite_predictor(trained_at: str):
+    """
+    Load the Treelite-compiled model for single-row predictions, if available.
+    Returns a function mapping a (1, 5) float32 row to probabilities, or None
+    when this model's library or treelite_runtime is missing.
+    """
+    libpath = treelite_lib_path(trained_at)
+    if not os.path.exists(libpath):
+        return None
+    
+    try:
+        import treelite_runtime
+    except ImportError:
+        print(f"⚠️ Warning: treelite_runtime not installed, ignoring {libpath}")
+        return None
+    
+    predictor = treelite_runtime.Predictor(libpath, nthread=1, verbose=False)
+    
+    print(f"✅ Treelite model loaded from {libpath}")
+    # Treelite squeezes single-row output to a scalar array
+    return lambda row: predictor.predict(treelite_runtime.DMatrix(row)).reshape(-1)
+
+
+def predict_probabilities(X: np.ndarray) -> np.ndarray:
+    """Churn probability for each row of an (N, 5) feature matrix."""
+    session = model_data.get('onnx')
+    if session is not None:
+        return session.run(["probabilities"], {"input": np.asarray(X, dtype=np.float32)})[0][:, 1]
+    
+    return model_data['booster'].inplace_predict(X)
 
 
 def get_risk_level(probability: float) -> tuple:
     """Determine risk level and recommendation based on churn probability."""
-    if probability >= 0.7:
-        return "HIGH", "Immediate intervention required. Consider offering retention incentives."
-    elif probability >= 0.4:
-        return "MEDIUM", "Proactive outreach recommended. Schedule a check-in call."
-    else:
-        return "LOW", "User appears engaged. Continue current engagement strategy."
+    index = (probability >= MEDIUM_RISK_THRESHOLD) + (probability >= HIGH_RISK_THRESHOLD)
+    return RISK_LEVELS[index], RISK_RECOMMENDATIONS[index]
 
 
-def get_primary_reason(features: 'UserFeatures') -> str:
+# Reason labels by reason code (0 = no risk signal)
+REASONS = (
+    "Healthy User",
+    "High Friction",
+    "Support Issues",
+    "Low Engagement",
+    "Low Activity",
+    "Short Sessions",
+    "Underutilizing Features",
+    "Stale Account"
+)
+
+
+@njit(cache=True)
+def _reason_code(
+    total_clicks: float,
+    avg_session_time: float,
+    support_tickets: float,
+    days_since_signup: float,
+    feature_usage_score: float
+) -> int:
     """
-    Determine the primary reason for churn risk (SHAP-like explanation).
-    Maps feature values to human-readable explanations.
+    Primary reason code (index into REASONS) for one user.
+    Same rules and tie order as primary_reason_codes, without allocating.
     """
-    reasons = []
+    code = 0
+    best = -1.0
     
     # Check support tickets (high friction indicator)
-    if features.support_tickets > 5:
-        reasons.append(("High Friction", features.support_tickets * 10))
-    elif features.support_tickets > 3:
-        reasons.append(("Support Issues", features.support_tickets * 5))
+    if support_tickets > 5:
+        code, best = 1, support_tickets * 10
+    elif support_tickets > 3:
+        code, best = 2, support_tickets * 5
     
     # Check engagement (low clicks)
-    if features.total_clicks < 10:
-        reasons.append(("Low Engagement", (10 - features.total_clicks) * 8))
-    elif features.total_clicks < 50:
-        reasons.append(("Low Activity", (50 - features.total_clicks) * 2))
+    if total_clicks < 10:
+        priority = (10 - total_clicks) * 8
+        if priority > best:
+            code, best = 3, priority
+    elif total_clicks < 50:
+        priority = (50 - total_clicks) * 2
+        if priority > best:
+            code, best = 4, priority
     
     # Check session time
-    if features.avg_session_time < 2.0:
-        reasons.append(("Short Sessions", int((2.0 - features.avg_session_time) * 15)))
+    if avg_session_time < 2.0:
+        priority = int((2.0 - avg_session_time) * 15)
+        if priority > best:
+            code, best = 5, priority
     
     # Check feature usage
-    if features.feature_usage_score < 20:
-        reasons.append(("Underutilizing Features", int(20 - features.feature_usage_score)))
+    if feature_usage_score < 20:
+        priority = int(20 - feature_usage_score)
+        if priority > best:
+            code, best = 6, priority
     
     # Check account age vs engagement
-    if features.days_since_signup > 60 and features.total_clicks < 30:
-        reasons.append(("Stale Account", 25))
+    if days_since_signup > 60 and total_clicks < 30:
+        if 25 > best:
+            code = 7
     
-    # Return the highest priority reason
-    if reasons:
-        reasons.sort(key=lambda x: x[1], reverse=True)
-        return reasons[0][0]
+    return code
+
+
+def get_primary_reason(features: 'UserFeatures') -> str:
+    """
+    Determine the primary reason for churn risk (SHAP-like explanation).
+    Maps feature values to human-readable explanations.
+    """
+    return REASONS[_reason_code(
+        features.total_clicks,
+        features.avg_session_time,
+        features.support_tickets,
+        features.days_since_signup,
+        features.feature_usage_score
+    )]
+
+
+def primary_reason_codes(X: np.ndarray) -> np.ndarray:
+    """
+    Vectorized get_primary_reason over an (N, 5) feature matrix.
+    Returns an index into REASONS per row. Each rule becomes a priority
+    column (-2 where it does not apply) and the highest priority wins;
+    the "Healthy User" column sits at -1 so it only wins when no rule fires.
+    """
+    clicks, session_time, tickets, days, score = X.T
+    
+    priorities = np.stack([
+        np.full(len(X), -1.0),
+        np.where(tickets > 5, tickets * 10, -2),
+        np.where((tickets > 3) & (tickets <= 5), tickets * 5, -2),
+        np.where(clicks < 10, (10 - clicks) * 8, -2),
+        np.where((clicks >= 10) & (clicks < 50), (50 - clicks) * 2, -2),
+        np.where(session_time < 2.0, np.trunc((2.0 - session_time) * 15), -2),
+        np.where(score < 20, np.trunc(20 - score), -2),
+        np.where((days > 60) & (clicks < 30), 25, -2)
+    ], axis=1)
     
-    return "Healthy User"
+    return priorities.argmax(axis=1)
+
+
+def _row_buffer() -> np.ndarray:
+    """This thread's reusable float32 input row."""
+    buffer = getattr(_row_buffers, "row", None)
+    if buffer is None:
+        buffer = _row_buffers.row = np.empty((1, len(FEATURE_COLUMNS)), dtype=np.float32)
+    return buffer
+
+
+def _predict_row(feature_values: tuple) -> float:
+    """Churn probability for one feature tuple."""
+    buffer = _row_buffer()
+    buffer[0] = feature_values
+    
+    predict_row = model_data.get('treelite')
+    if predict_row is not None:
+        return float(predict_row(buffer)[0])
+    
+    return float(predict_probabilities(buffer)[0])
 
 
 def make_prediction(features: UserFeatures) -> PredictionResponse:
     """Make a single prediction."""
+    generation = _model_generation
     if model_data is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
-    model = model_data['model']
-    
-    # Prepare features in correct order
-    feature_values = [[
+    # Features in correct order double as the cache key
+    feature_values = (
         features.total_clicks,
         features.avg_session_time,
         features.support_tickets,
         features.days_since_signup,
         features.feature_usage_score
-    ]]
+    )
+    key = (generation, feature_values)
+    
+    with _prediction_cache_lock:
+        cached = _prediction_cache.get(key)
+    if cached is not None:
+        return cached
     
-    # Get prediction and probability
-    prediction = model.predict(feature_values)[0]
-    probability = model.predict_proba(feature_values)[0][1]
+    probability = _predict_row(feature_values)
+    prediction = probability > 0.5
     
     risk_level, recommendation = get_risk_level(probability)
     primary_reason = get_primary_reason(features)
     
-    return PredictionResponse(
+    response = PredictionResponse(
         is_churned=bool(prediction),
         churn_probability=round(float(probability), 4),
         risk_level=risk_level,
         recommendation=recommendation,
         primary_reason=primary_reason
     )
+    with _prediction_cache_lock:
+        _prediction_cache[key] = response
+    
+    return response
 
 
-# API Endpoints
-@app.on_event("startup")
-async def startup_event():
-    """Load model on startup."""
+def make_predictions_bulk(features_list: List[UserFeatures]) -> Tuple[List[dict], List[int]]:
+    """
+    Make predictions for many users with a single model call.
+    Returns the predictions and the LOW/MEDIUM/HIGH risk counts.
+    """
+    # Fill one (N, 5) matrix in training column order straight from the
+    # models, without an intermediate list of rows. Kept in float64 so
+    # reason thresholds match get_primary_reason exactly; XGBoost casts
+    # to float32 internally.
+    X = np.fromiter(
+        itertools.chain.from_iterable(map(operator.attrgetter(*FEATURE_COLUMNS), features_list)),
+        dtype=np.float64,
+        count=len(features_list) * len(FEATURE_COLUMNS)
+    ).reshape(-1, len(FEATURE_COLUMNS))
+    
+    return make_predictions_matrix(X)
+
+
+def score_probabilities(X: np.ndarray) -> np.ndarray:
+    """Churn probability for each row of a non-empty (N, 5) feature matrix."""
+    # Score each distinct feature row once and scatter results back. Upcast
+    # so threshold comparisons happen in float64 like get_risk_level; against
+    # a float32 array, 0.7 would be compared as float32(0.7) < 0.7.
+    unique_rows, inverse = np.unique(X, axis=0, return_inverse=True)
+    return predict_probabilities(unique_rows).astype(np.float64)[inverse.reshape(-1)]
+
+
+def risk_indexes(probabilities: np.ndarray) -> np.ndarray:
+    """Risk index (0/1/2 = LOW/MEDIUM/HIGH) for each probability."""
+    return (
+        (probabilities >= MEDIUM_RISK_THRESHOLD).astype(np.int8)
+        + (probabilities >= HIGH_RISK_THRESHOLD).astype(np.int8)
+    )
+
+
+def score_matrix(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Score each row of a non-empty (N, 5) feature matrix with one model call.
+    Returns churn probabilities, risk index (0/1/2 = LOW/MEDIUM/HIGH) and
+    primary reason codes (indexes into REASONS).
+    """
+    probabilities = score_probabilities(X)
+    return probabilities, risk_indexes(probabilities), primary_reason_codes(X)
+
+
+def round_probabilities(probabilities: np.ndarray) -> np.ndarray:
+    """
+    Round float32-valued probabilities to 4 decimals, as round(p, 4) would.
+    Exact: p * 1e4 fits in a float64 mantissa, so only the final division
+    rounds, and it rounds to the same double as Python's round.
+    """
+    return np.round(probabilities, 4)
+
+
+def make_predictions_matrix(X: np.ndarray) -> Tuple[List[dict], List[int]]:
+    """
+    Make predictions for each row of an (N, 5) feature matrix.
+    Returns PredictionResponse-shaped dicts and the LOW/MEDIUM/HIGH risk counts.
+    """
+    if model_data is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    if len(X) == 0:
+        return [], [0, 0, 0]
+    
+    probabilities, risk_index, reason_codes = score_matrix(X)
+    risk_counts = np.bincount(risk_index, minlength=len(RISK_LEVELS)).tolist()
+    risk_index = risk_index.tolist()
+    
+    # Plain dicts in PredictionResponse field order: every value comes from
+    # the model or a fixed lookup, so there is nothing to validate per row
+    predictions = [
+        {
+            "is_churned": is_churned,
+            "churn_probability": probability,
+            "risk_level": RISK_LEVELS[index],
+            "recommendation": RISK_RECOMMENDATIONS[index],
+            "primary_reason": REASONS[code]
+        }
+        for is_churned, probability, index, code in zip(
+            (probabilities > 0.5).tolist(),
+            round_probabilities(probabilities).tolist(),
+            risk_index,
+            reason_codes.tolist()
+        )
+    ]
+    
+    return predictions, risk_counts
+
+
+def batch_response(predictions: List[dict], risk_counts: List[int]) -> ORJSONResponse:
+    """
+    Wrap batch predictions with aggregate risk counts.
+    Serialized here in BatchPredictionResponse shape, skipping FastAPI's
+    response_model pass over every row.
+    """
+    low_risk, medium_risk, high_risk = risk_counts
+    
+    return ORJSONResponse({
+        "predictions": predictions,
+        "total_users": len(predictions),
+        "high_risk_count": high_risk,
+        "medium_risk_count": medium_risk,
+        "low_risk_count": low_risk
+    })
+
+
+async def fetch_user_rows(columns: tuple, limit: int) -> list:
+    """
+    Read user_segments rows, served from a short TTL cache.
+    Falls back to the last successful read if Supabase errors.
+    """
+    if SUPABASE is None:
+        raise HTTPException(status_code=500, detail="Supabase not configured")
+    
+    key = (columns, limit)
+    rows = _query_cache.get(key)
+    if rows is not None:
+        return rows
+    
+    try:
+        result = await SUPABASE.table("user_segments").select(",".join(columns)).limit(limit).execute()
+    except Exception as e:
+        last_rows = _last_known_rows.get(columns)
+        if last_rows is None:
+            raise
+        print(f"⚠️ Warning: Supabase read failed ({e}), serving last known data")
+        return last_rows[:limit]
+    
+    # One fallback per column set: keying it on limit too would keep a full
+    # row list for every limit a client ever asked for
+    _query_cache[key] = _last_known_rows[columns] = result.data
+    return result.data
+
+
+async def cached_response(key: tuple, compute):
+    """
+    Return the cached response for key, computing it on a miss.
+    Misses are computed under a lock so concurrent polls share one fetch.
+    """
+    key = (_model_generation, *key)
+    result = _response_cache.get(key)
+    if result is not None:
+        return result
+    
+    async with _response_cache_lock:
+        result = _response_cache.get(key)
+        if result is None:
+            result = await compute()
+            _response_cache[key] = result
+    
+    return result
+
+
+def warm_up_model():
+    """Run one dummy prediction so the first request doesn't pay cold-start costs."""
+    start = time.perf_counter()
+    
+    dummy = np.zeros((1, len(FEATURE_COLUMNS)), dtype=np.float64)
+    predict_probabilities(dummy)
+    primary_reason_codes(dummy)
+    # Same argument types as a validated UserFeatures, so /predict reuses
+    # this compiled signature instead of JIT-compiling on its first call
+    _reason_code(0, 0.0, 0, 0, 0.0)
+    
+    print(f"🔥 Model warmed up in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def now_iso() -> str:
+    """Current local time in ISO format, formatted at most once per second."""
+    global _timestamp_cache
+    
+    second = int(time.time())
+    if second != _timestamp_cache[0]:
+        _timestamp_cache = (second, datetime.fromtimestamp(second).isoformat())
+    
+    return _timestamp_cache[1]
+
+
+def static_json_response(name: str, build) -> Response:
+    """Serve a payload that is serialized once per loaded model."""
+    key = (_model_generation, name)
+    body = _static_payloads.get(key)
+    if body is None:
+        body = orjson.dumps(build(), option=orjson.OPT_SERIALIZE_NUMPY)
+        _static_payloads[key] = body
+    
+    return Response(content=body, media_type="application/json")
+
+
+# Load the model at import rather than on startup, so a preloading server
+# (gunicorn --preload) forks workers that share it copy-on-write. Warm-up
+# stays in startup_event so inference thread pools start inside each worker.
+# Skipped when run as a script: the `python main.py` supervisor never serves,
+# and its spawned workers re-run this file as __mp_main__ before importing
+# main:app, which is where they load.
+if __name__ not in ("__main__", "__mp_main__"):
     try:
         load_model()
     except FileNotFoundError as e:
         print(f"⚠️ Warning: {e}")
 
 
+# API Endpoints
+@app.on_event("startup")
+async def startup_event():
+    """Warm up the model and create the shared Supabase client on startup."""
+    global SUPABASE
+    
+    if model_data is not None:
+        warm_up_model()
+    
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_KEY")
+    
+    if supabase_url and supabase_key:
+        SUPABASE = await create_async_client(supabase_url, supabase_key)
+    else:
+        print("⚠️ Warning: SUPABASE_URL or SUPABASE_KEY not set, database endpoints disabled")
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint."""
-    return HealthResponse(
-        status="healthy",
-        model_loaded=model_data is not None,
-        timestamp=datetime.now().isoformat()
-    )
+    return ORJSONResponse({
+        "status": "healthy",
+        "model_loaded": model_data is not None,
+        "timestamp": now_iso()
+    })
 
 
 @app.post("/predict", response_model=PredictionResponse)
-async def predict(features: UserFeatures):
+def predict(features: UserFeatures):
     """
     Predict churn for a single user.
     
@@ -238,38 +754,39 @@ async def predict(features: UserFeatures):
 
 
 @app.post("/predict/batch", response_model=BatchPredictionResponse)
-async def predict_batch(request: BatchPredictionRequest):
+def predict_batch(request: BatchPredictionRequest):
     """
     Predict churn for multiple users.
     
     Returns predictions for all users plus aggregate statistics.
     """
-    predictions = [make_prediction(user) for user in request.users]
-    
-    high_risk = sum(1 for p in predictions if p.risk_level == "HIGH")
-    medium_risk = sum(1 for p in predictions if p.risk_level == "MEDIUM")
-    low_risk = sum(1 for p in predictions if p.risk_level == "LOW")
+    return batch_response(*make_predictions_bulk(request.users))
+
+
+@app.post("/predict/batch/raw", response_model=BatchPredictionResponse)
+def predict_batch_raw(request: BatchPredictionRawRequest):
+    """
+    Predict churn for rows of raw feature values.
     
-    return BatchPredictionResponse(
-        predictions=predictions,
-        total_users=len(predictions),
-        high_risk_count=high_risk,
-        medium_risk_count=medium_risk,
-        low_risk_count=low_risk
-    )
+    Each row is [total_clicks, avg_session_time, support_tickets,
+    days_since_signup, feature_usage_score]. Skips per-user model
+    validation for machine clients sending large batches.
+    """
+    X = np.asarray(request.rows, dtype=np.float64).reshape(-1, len(FEATURE_COLUMNS))
+    return batch_response(*make_predictions_matrix(X))
 
 
 @app.get("/model/info", response_model=ModelInfo)
-async def model_info():
+def model_info():
     """Get model metadata and performance metrics."""
     if model_data is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
-    return ModelInfo(
+    return static_json_response("model_info", lambda: ModelInfo(
         trained_at=model_data.get('trained_at', 'unknown'),
         features=model_data.get('features', []),
         metrics=model_data.get('metrics', {})
-    )
+    ).model_dump())
 
 
 @app.get("/users/risk")
@@ -278,59 +795,86 @@ async def get_users_with_risk(limit: int = 50, min_risk: float = 0.0):
     Get users from database with their churn risk predictions.
     Used by the admin dashboard to display the risk table.
     """
-    from supabase import create_client
-    
-    supabase_url = os.getenv("SUPABASE_URL")
-    supabase_key = os.getenv("SUPABASE_KEY")
+    payload = await cached_response(
+        ("users_risk", limit, min_risk),
+        lambda: _build_users_with_risk(limit, min_risk)
+    )
     
-    if not supabase_url or not supabase_key:
-        raise HTTPException(status_code=500, detail="Supabase not configured")
+    return StreamingResponse(stream_users_json(payload), media_type="application/json")
+
+
+async def stream_users_json(payload: dict):
+    """
+    Serialize a /users/risk payload incrementally, a chunk of user rows at a
+    time, so large responses never exist as one encoded blob.
+    """
+    users = payload["users"]
     
-    supabase = create_client(supabase_url, supabase_key)
+    yield b'{"users":['
+    for start in range(0, len(users), STREAM_CHUNK_ROWS):
+        # One orjson call per chunk; strip the list brackets to splice it in
+        chunk = orjson.dumps(users[start:start + STREAM_CHUNK_ROWS])[1:-1]
+        yield (b"," if start else b"") + chunk
+    yield b"]"
     
+    for key, value in payload.items():
+        if key != "users":
+            yield b"," + orjson.dumps(key) + b":" + orjson.dumps(value)
+    yield b"}"
+
+
+async def _build_users_with_risk(limit: int, min_risk: float) -> dict:
+    """Fetch users and attach churn predictions for /users/risk."""
     # Fetch users from user_segments table
-    result = supabase.table("user_segments").select("*").limit(limit).execute()
+    users = await fetch_user_rows(("id", "user_id", *FEATURE_COLUMNS, "is_churned"), limit)
     
-    if not result.data:
+    if not users:
         return {"users": [], "high_risk_count": 0}
     
-    # Add predictions to each user
-    users_with_risk = []
-    high_risk_count = 0
-    
-    for user in result.data:
-        features = UserFeatures(
-            total_clicks=user.get('total_clicks', 0),
-            avg_session_time=user.get('avg_session_time', 0),
-            support_tickets=user.get('support_tickets', 0),
-            days_since_signup=user.get('days_since_signup', 0),
-            feature_usage_score=user.get('feature_usage_score', 0)
-        )
-        
-        prediction = make_prediction(features)
-        
-        if prediction.churn_probability >= min_risk:
-            user_data = {
-                "id": user.get('id'),
-                "user_id": user.get('user_id'),
-                "total_clicks": user.get('total_clicks'),
-                "avg_session_time": user.get('avg_session_time'),
-                "support_tickets": user.get('support_tickets'),
-                "days_since_signup": user.get('days_since_signup'),
-                "feature_usage_score": user.get('feature_usage_score'),
-                "is_churned": user.get('is_churned'),
-                "churn_probability": prediction.churn_probability,
-                "risk_level": prediction.risk_level,
-                "primary_reason": prediction.primary_reason,
-                "recommendation": prediction.recommendation
-            }
-            users_with_risk.append(user_data)
-            
-            if prediction.churn_probability >= 0.8:
-                high_risk_count += 1
+    if model_data is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    # Feature matrix straight from the rows (missing values count as 0)
+    X = np.fromiter(
+        ((u.get(feat) or 0) for u in users for feat in FEATURE_COLUMNS),
+        dtype=np.float64,
+        count=len(users) * len(FEATURE_COLUMNS)
+    ).reshape(len(users), len(FEATURE_COLUMNS))
     
-    # Sort by risk descending
-    users_with_risk.sort(key=lambda x: x['churn_probability'], reverse=True)
+    # Score all users with a single model call
+    probabilities = await run_in_threadpool(score_probabilities, X)
+    churn_probabilities = round_probabilities(probabilities)
+    
+    # Keep users at or above min_risk, sorted by risk descending
+    selected = np.flatnonzero(churn_probabilities >= min_risk)
+    selected = selected[np.argsort(-churn_probabilities[selected], kind="stable")]
+    high_risk_count = int(np.count_nonzero(churn_probabilities[selected] >= 0.8))
+    
+    # Risk levels and reasons only for the users being returned
+    rows = zip(
+        map(users.__getitem__, selected.tolist()),
+        churn_probabilities[selected].tolist(),
+        risk_indexes(probabilities[selected]).tolist(),
+        primary_reason_codes(X[selected]).tolist()
+    )
+    
+    users_with_risk = [
+        {
+            "id": user.get('id'),
+            "user_id": user.get('user_id'),
+            "total_clicks": user.get('total_clicks'),
+            "avg_session_time": user.get('avg_session_time'),
+            "support_tickets": user.get('support_tickets'),
+            "days_since_signup": user.get('days_since_signup'),
+            "feature_usage_score": user.get('feature_usage_score'),
+            "is_churned": user.get('is_churned'),
+            "churn_probability": probability,
+            "risk_level": RISK_LEVELS[index],
+            "primary_reason": REASONS[code],
+            "recommendation": RISK_RECOMMENDATIONS[index]
+        }
+        for user, probability, index, code in rows
+    ]
     
     return {
         "users": users_with_risk,
@@ -349,49 +893,37 @@ async def get_user_segments():
     Cluster users into persona segments based on behavior patterns.
     Uses K-means-like logic to categorize users.
     """
+    return await cached_response(("segments",), _build_user_segments)
+
+
+async def _build_user_segments() -> dict:
+    """Fetch users and compute segment stats for /segments."""
     try:
-        # Get Supabase client
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_KEY")
+        # Fetch users
+        users = await fetch_user_rows(("user_id", *FEATURE_COLUMNS), 500)
         
-        if not supabase_url or not supabase_key:
-            raise HTTPException(status_code=500, detail="Supabase not configured")
+        # Columnar view of the user features
+        clicks, session_time, tickets, days, score = (
+            np.fromiter((u.get(feat, 0) for u in users), dtype=np.float64, count=len(users))
+            for feat in FEATURE_COLUMNS
+        )
+        user_ids = np.array([u["user_id"] for u in users], dtype=object)
         
-        from supabase import create_client
-        supabase = create_client(supabase_url, supabase_key)
+        # Segmentation logic, applied in priority order
+        is_new = days <= 30
+        is_power = ~is_new & (clicks > 500) & (session_time > 30) & (score > 70)
+        is_dormant = ~is_new & ~is_power & ((clicks < 50) | (session_time < 5))
+        is_at_risk = ~is_new & ~is_power & ~is_dormant & ((tickets > 3) | (score < 30))
+        is_engaged = ~(is_new | is_power | is_dormant | is_at_risk)
         
-        # Fetch users
-        response = supabase.table("user_segments").select("*").limit(500).execute()
-        users = response.data
-        
-        # Define segments based on behavior thresholds
         segments = {
-            "power_users": [],
-            "at_risk": [],
-            "dormant": [],
-            "new_users": [],
-            "engaged": []
+            "power_users": user_ids[is_power].tolist(),
+            "at_risk": user_ids[is_at_risk].tolist(),
+            "dormant": user_ids[is_dormant].tolist(),
+            "new_users": user_ids[is_new].tolist(),
+            "engaged": user_ids[is_engaged].tolist()
         }
         
-        for user in users:
-            clicks = user.get("total_clicks", 0)
-            session_time = user.get("avg_session_time", 0)
-            tickets = user.get("support_tickets", 0)
-            days = user.get("days_since_signup", 0)
-            score = user.get("feature_usage_score", 0)
-            
-            # Segmentation logic
-            if days <= 30:
-                segments["new_users"].append(user["user_id"])
-            elif clicks > 500 and session_time > 30 and score > 70:
-                segments["power_users"].append(user["user_id"])
-            elif clicks < 50 or session_time < 5:
-                segments["dormant"].append(user["user_id"])
-            elif tickets > 3 or score < 30:
-                segments["at_risk"].append(user["user_id"])
-            else:
-                segments["engaged"].append(user["user_id"])
-        
         # Calculate segment stats
         segment_stats = []
         for name, user_ids in segments.items():
@@ -419,61 +951,45 @@ async def detect_feature_drift():
     to training baseline. Returns drift alerts for each feature.
     """
     try:
-        # Get Supabase client
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_KEY")
-        
-        if not supabase_url or not supabase_key:
-            raise HTTPException(status_code=500, detail="Supabase not configured")
-        
-        from supabase import create_client
-        supabase = create_client(supabase_url, supabase_key)
-        
         # Fetch recent users (last 100)
-        response = supabase.table("user_segments").select("*").limit(100).execute()
-        users = response.data
+        users = await fetch_user_rows(FEATURE_COLUMNS, 100)
         
         if not users:
             return {"success": True, "drift_detected": False, "message": "No data to analyze"}
         
-        # Calculate current statistics
-        import numpy as np
-        features = ["total_clicks", "avg_session_time", "support_tickets", 
-                   "days_since_signup", "feature_usage_score"]
-        
-        current_stats = {}
-        for feat in features:
-            values = [u.get(feat, 0) for u in users]
-            current_stats[feat] = {
-                "mean": float(np.mean(values)),
-                "std": float(np.std(values)),
-                "min": float(np.min(values)),
-                "max": float(np.max(values))
-            }
+        # Calculate current statistics over a (5, N) feature-major matrix,
+        # so each feature reduces over one contiguous row
+        values = np.fromiter(
+            (u.get(feat, 0) for feat in FEATURE_COLUMNS for u in users),
+            dtype=np.float64,
+            count=len(FEATURE_COLUMNS) * len(users)
+        ).reshape(len(FEATURE_COLUMNS), len(users))
         
-        # Training baseline (hardcoded from training data)
-        baseline = {
-            "total_clicks": {"mean": 300, "std": 200},
-            "avg_session_time": {"mean": 20, "std": 15},
-            "support_tickets": {"mean": 2, "std": 2},
-            "days_since_signup": {"mean": 180, "std": 100},
-            "feature_usage_score": {"mean": 50, "std": 25}
+        current_stats = {
+            feat: {"mean": mean, "std": std, "min": min_, "max": max_}
+            for feat, mean, std, min_, max_ in zip(
+                FEATURE_COLUMNS,
+                values.mean(axis=1).tolist(),
+                values.std(axis=1).tolist(),
+                values.min(axis=1).tolist(),
+                values.max(axis=1).tolist()
+            )
         }
         
         # Detect drift (if current mean deviates > 2 std from baseline)
         drift_alerts = []
-        for feat in features:
-            if feat in baseline:
-                mean_diff = abs(current_stats[feat]["mean"] - baseline[feat]["mean"])
-                threshold = baseline[feat]["std"] * 2
+        for feat in FEATURE_COLUMNS:
+            if feat in DRIFT_BASELINE:
+                mean_diff = abs(current_stats[feat]["mean"] - DRIFT_BASELINE[feat]["mean"])
+                threshold = DRIFT_BASELINE[feat]["std"] * 2
                 
                 if mean_diff > threshold:
                     drift_alerts.append({
                         "feature": feat,
                         "severity": "high" if mean_diff > threshold * 1.5 else "medium",
-                        "baseline_mean": baseline[feat]["mean"],
+                        "baseline_mean": DRIFT_BASELINE[feat]["mean"],
                         "current_mean": current_stats[feat]["mean"],
-                        "deviation": round(mean_diff / baseline[feat]["std"], 2)
+                        "deviation": round(mean_diff / DRIFT_BASELINE[feat]["std"], 2)
                     })
         
         return {
@@ -482,25 +998,78 @@ async def detect_feature_drift():
             "alert_count": len(drift_alerts),
             "alerts": drift_alerts,
             "current_stats": current_stats,
-            "analyzed_at": datetime.now().isoformat()
+            "analyzed_at": now_iso()
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def run_retrain(job_id: str):
+    """
+    Retrain the model in a subprocess and reload it on success.
+    Runs after the /model/retrain response has been sent.
+    """
+    job = RETRAIN_JOBS[job_id]
+    job["status"] = "running"
+    job["started_at"] = datetime.now().isoformat()
+    
+    try:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "train_model.py",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        
+        if process.returncode == 0:
+            # Read and warm up off the event loop; the swap itself stays on
+            # the loop, which owns the response cache it clears
+            activate_model(await run_in_threadpool(read_model))
+            await run_in_threadpool(warm_up_model)
+            job["status"] = "completed"
+        else:
+            job["status"] = "failed"
+            job["error"] = stderr.decode(errors="replace")[-1000:]
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        job["finished_at"] = datetime.now().isoformat()
+
+
 @app.post("/model/retrain")
-async def trigger_model_retrain():
+async def trigger_model_retrain(background_tasks: BackgroundTasks):
     """
-    Trigger model retraining (stub for now).
-    In production, this would queue a retraining job.
+    Trigger model retraining.
+    Queues a background job and returns immediately; poll
+    /model/retrain/status/{job_id} for progress.
     """
+    # One job at a time: concurrent runs would write the same model files
+    for job in RETRAIN_JOBS.values():
+        if job["status"] in ("queued", "running"):
+            raise HTTPException(
+                status_code=409,
+                detail=f"Retrain job {job['job_id']} is already {job['status']}"
+            )
+    
+    job_id = uuid.uuid4().hex
+    triggered_at = datetime.now().isoformat()
+    
+    RETRAIN_JOBS[job_id] = {
+        "job_id": job_id,
+        "status": "queued",
+        "triggered_at": triggered_at
+    }
+    background_tasks.add_task(run_retrain, job_id)
+    
     return {
         "success": True,
         "message": "Model retraining triggered",
+        "job_id": job_id,
         "status": "queued",
         "estimated_time": "5-10 minutes",
-        "triggered_at": datetime.now().isoformat()
+        "triggered_at": triggered_at
     }
 
 
@@ -514,16 +1083,56 @@ async def get_retrain_status():
     if not model_data:
         return {"success": False, "error": "Model not loaded"}
     
+    # Jobs are kept in trigger order, so the last one is the newest
+    jobs = list(RETRAIN_JOBS.values())
+    latest_job = jobs[-1] if jobs else None
+    completed = [job for job in jobs if job["status"] == "completed"]
+    
     return {
         "success": True,
         "model_version": model_data.get("model_version", "1.0.0"),
         "trained_at": model_data.get("trained_at", "unknown"),
-        "last_retrain": None,
-        "status": "idle",
+        "last_retrain": completed[-1]["finished_at"] if completed else None,
+        "status": latest_job["status"] if latest_job and latest_job["status"] in ("queued", "running") else "idle",
         "next_scheduled": "Weekly - Sunday 2:00 AM"
     }
 
 
+@app.get("/model/retrain/status/{job_id}")
+async def get_retrain_job_status(job_id: str):
+    """
+    Get the status of a retraining job.
+    """
+    job = RETRAIN_JOBS.get(job_id)
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Retrain job not found")
+    
+    return {"success": True, **job}
+
+
+@app.post("/cache/invalidate")
+async def invalidate_cache():
+    """
+    Flush cached /users/risk and /segments responses and Supabase reads.
+    """
+    cleared = len(_response_cache) + len(_query_cache)
+    _response_cache.clear()
+    _query_cache.clear()
+    
+    return {
+        "success": True,
+        "cleared": cleared
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Single worker by default: retrain jobs, caches and the reloaded model
+    # live in process memory, so extra workers would disagree on all three.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", "1"))
+    )
@@ -15,9 +15,12 @@ Target:
 """
 
 import os
+import re
+import copy
+import glob
+import json
 import pickle
 import numpy as np
-import pandas as pd
 from datetime import datetime
 from dotenv import load_dotenv
 from supabase import create_client, Client
@@ -55,53 +58,94 @@ FEATURE_COLUMNS = [
 ]
 TARGET_COLUMN = 'is_churned'
 
+# Rows requested per Supabase page (the server may cap it lower via max_rows)
+FETCH_PAGE_SIZE = 1000
 
-def fetch_training_data() -> pd.DataFrame:
-    """Fetch user segments data from Supabase."""
+
+def fetch_training_data() -> np.ndarray:
+    """
+    Fetch user segments data from Supabase.
+    Returns an (N, 6) float32 array: FEATURE_COLUMNS followed by the target.
+    """
     print("📥 Fetching training data from Supabase...")
     
-    # Fetch all rows (paginate if needed for larger datasets)
-    result = supabase.table("user_segments").select("*").execute()
+    columns = FEATURE_COLUMNS + [TARGET_COLUMN]
+    pages = []
+    offset = 0
+    
+    # Page through the table; a single select is capped by the API row limit
+    while True:
+        result = (
+            supabase.table("user_segments")
+            .select(",".join(columns))
+            .order("id")
+            .range(offset, offset + FETCH_PAGE_SIZE - 1)
+            .execute()
+        )
+        if not result.data:
+            break
+        
+        # Missing values become NaN, which XGBoost treats as missing
+        pages.append(np.array(
+            [[row[column] for column in columns] for row in result.data],
+            dtype=np.float32
+        ))
+        # Advance by what came back: the project's max_rows may be below the
+        # requested page size, so a short page doesn't mean the last page
+        offset += len(result.data)
     
-    if not result.data:
+    if not pages:
         raise ValueError("No data found in user_segments table")
     
-    df = pd.DataFrame(result.data)
-    print(f"   Loaded {len(df)} records")
+    data = np.concatenate(pages)
+    print(f"   Loaded {len(data)} records")
     
-    return df
+    return data
 
 
-def prepare_features(df: pd.DataFrame):
+def prepare_features(data: np.ndarray):
     """Prepare features and target for training."""
     print("🔧 Preparing features...")
     
-    # Select features
-    X = df[FEATURE_COLUMNS].copy()
-    y = df[TARGET_COLUMN].astype(int)
+    # Split features and target
+    X = data[:, :len(FEATURE_COLUMNS)]
+    y = data[:, len(FEATURE_COLUMNS)].astype(int)
     
+    labels, counts = np.unique(y, return_counts=True)
     print(f"   Features shape: {X.shape}")
-    print(f"   Target distribution: {y.value_counts().to_dict()}")
+    print(f"   Target distribution: {dict(zip(labels.tolist(), counts.tolist()))}")
     
     return X, y
 
 
-def train_model(X_train, y_train):
-    """Train XGBoost classifier."""
+def train_model(X_train, y_train, X_val, y_val):
+    """
+    Train XGBoost classifier.
+    Stops adding trees once validation AUC stops improving, then keeps only
+    the trees up to the best iteration so every export serves the same model.
+    """
     print("🚀 Training XGBoost model...")
     
     model = XGBClassifier(
-        n_estimators=100,
+        tree_method='hist',
+        n_estimators=500,
         max_depth=5,
         learning_rate=0.1,
         objective='binary:logistic',
         eval_metric='auc',
-        use_label_encoder=False,
+        early_stopping_rounds=20,
+        n_jobs=-1,
         random_state=42
     )
     
-    model.fit(X_train, y_train)
-    print("   ✓ Model trained successfully")
+    model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+    
+    # Drop the trees grown after the best iteration; the native booster,
+    # ONNX and Treelite exports would otherwise predict with all of them
+    best_iteration = model.best_iteration
+    model.load_model(model.get_booster()[:best_iteration + 1].save_raw("ubj"))
+    
+    print(f"   ✓ Model trained successfully ({best_iteration + 1} trees)")
     
     return model
 
@@ -153,8 +197,12 @@ def get_feature_importance(model, feature_names):
     return importance
 
 
-def save_model(model, metrics, filepath='models/churn_model.pkl'):
-    """Save trained model to disk."""
+def save_model(model, metrics, trained_at, filepath='models/churn_model.pkl'):
+    """
+    Save trained model to disk.
+    Writes the native XGBoost booster (.ubj) with its metadata (.json) next
+    to the pickle; the API loads the native files first.
+    """
     # Create models directory if it doesn't exist
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
     
@@ -162,16 +210,118 @@ def save_model(model, metrics, filepath='models/churn_model.pkl'):
         'model': model,
         'features': FEATURE_COLUMNS,
         'metrics': metrics,
-        'trained_at': datetime.now().isoformat()
+        'trained_at': trained_at
     }
     
     with open(filepath, 'wb') as f:
         pickle.dump(model_data, f)
     
-    print(f"\n💾 Model saved to: {filepath}")
+    # Native booster: version-stable and loadable without sklearn
+    base_path = os.path.splitext(filepath)[0]
+    model.get_booster().save_model(f"{base_path}.ubj")
+    
+    with open(f"{base_path}.json", 'w') as f:
+        json.dump({
+            'features': FEATURE_COLUMNS,
+            'metrics': {name: float(value) for name, value in metrics.items()},
+            'trained_at': model_data['trained_at']
+        }, f, indent=2)
+    
+    print(f"\n💾 Model saved to: {filepath} (native booster: {base_path}.ubj)")
     return filepath
 
 
+def export_onnx(model, trained_at, filepath='models/churn_model.onnx'):
+    """
+    Export the model to ONNX for onnxruntime serving.
+    Optional: skipped when onnxmltools is not installed or conversion fails,
+    since the model itself is already saved.
+    """
+    try:
+        from onnxmltools import convert_xgboost
+        from onnxmltools.convert.common.data_types import FloatTensorType
+    except ImportError:
+        # Don't leave an older model's export behind
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        print("⚠️ onnxmltools not installed, skipping ONNX export")
+        return None
+    
+    # The converter only understands positional feature names (f0, f1, ...)
+    onnx_source = copy.deepcopy(model)
+    onnx_source.get_booster().feature_names = None
+    
+    try:
+        onnx_model = convert_xgboost(
+            onnx_source,
+            initial_types=[('input', FloatTensorType([None, len(FEATURE_COLUMNS)]))]
+        )
+        # Lets the API check the export belongs to the model it loaded
+        onnx_model.metadata_props.add(key='trained_at', value=trained_at)
+        
+        with open(filepath, 'wb') as f:
+            f.write(onnx_model.SerializeToString())
+    except Exception as e:
+        # Also drops a partially written export
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        print(f"⚠️ ONNX conversion failed ({e}), skipping ONNX export")
+        return None
+    
+    print(f"💾 ONNX model saved to: {filepath}")
+    return filepath
+
+
+def treelite_lib_path(trained_at, models_dir='models'):
+    """
+    Library path for the model trained at `trained_at`.
+    Each model gets its own file: dlopen hands back an already-open library
+    for a path it has seen, so reusing one name would keep serving old trees.
+    """
+    tag = re.sub(r'\W', '', trained_at)
+    return os.path.join(models_dir, f"churn_model.{tag}.so")
+
+
+def remove_treelite_libs(keep=None, models_dir='models'):
+    """Delete compiled libraries from earlier models (all but `keep`)."""
+    for libpath in glob.glob(os.path.join(models_dir, 'churn_model*.so')):
+        if libpath != keep:
+            os.remove(libpath)
+
+
+def export_treelite(model, trained_at):
+    """
+    Compile the tree ensemble into a native shared library with Treelite.
+    Optional: skipped when treelite is not installed or compilation fails
+    (e.g. no gcc), since the model itself is already saved.
+    """
+    try:
+        import treelite
+    except ImportError:
+        # Don't leave an older model's library behind
+        remove_treelite_libs()
+        print("⚠️ treelite not installed, skipping native model compilation")
+        return None
+    
+    libpath = treelite_lib_path(trained_at)
+    try:
+        tl_model = treelite.Model.from_xgboost(model.get_booster())
+        tl_model.export_lib(
+            toolchain='gcc',
+            libpath=libpath,
+            params={'parallel_comp': 4, 'quantize': 1}
+        )
+    except Exception as e:
+        # Also drops a partially written library for this model
+        remove_treelite_libs()
+        print(f"⚠️ Treelite compilation failed ({e}), skipping native model compilation")
+        return None
+    remove_treelite_libs(keep=libpath)
+    
+    print(f"💾 Treelite library saved to: {libpath}")
+    return libpath
+
+
 def main():
     print("=" * 60)
     print("ChurnGuard: XGBoost Model Training")
@@ -179,22 +329,27 @@ def main():
     print()
     
     # Fetch data
-    df = fetch_training_data()
+    data = fetch_training_data()
     
     # Prepare features
-    X, y = prepare_features(df)
+    X, y = prepare_features(data)
     
     # Split data
     print("📂 Splitting data (80% train, 20% test)...")
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, random_state=42, stratify=y
     )
+    # Hold out part of the training set for early stopping
+    X_train, X_val, y_train, y_val = train_test_split(
+        X_train, y_train, test_size=0.1, random_state=42, stratify=y_train
+    )
     print(f"   Train: {len(X_train)} samples")
+    print(f"   Val:   {len(X_val)} samples")
     print(f"   Test:  {len(X_test)} samples")
     print()
     
     # Train model
-    model = train_model(X_train, y_train)
+    model = train_model(X_train, y_train, X_val, y_val)
     
     # Evaluate
     metrics = evaluate_model(model, X_test, y_test)
@@ -203,7 +358,10 @@ def main():
     get_feature_importance(model, FEATURE_COLUMNS)
     
     # Save model
-    model_path = save_model(model, metrics)
+    trained_at = datetime.now().isoformat()
+    model_path = save_model(model, metrics, trained_at)
+    export_onnx(model, trained_at)
+    export_treelite(model, trained_at)
     
     print()
     print("=" * 60)